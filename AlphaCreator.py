@@ -1,11 +1,85 @@
 import requests
 import json
+import hashlib
+import os
 import pandas as pd
 import csv
 import logging
+import random
 import time
+import concurrent.futures
+from itertools import chain
 from os.path import expanduser
+from urllib.parse import urlencode
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
+from urllib3.util.retry import Retry
+
+from brain_session import drop_basic_auth, load_cached_session, save_session_cache
+
+
+logger = logging.getLogger(__name__)
+
+# data-fields 元数据缓存目录（按搜索范围 + 数据集 ID 分文件）
+DATAFIELDS_CACHE_DIR = '~/.cache/alphacreator'
+
+# 所有 Alpha 共用的回测设置（neutralization 单独指定）
+_BASE_SETTINGS = {
+    "instrumentType": "EQUITY", "region": "USA", "universe": "TOP3000",
+    "delay": 1, "decay": 0,
+    "truncation": 0.01, "pasteurization": "ON", "unitHandling": "VERIFY",
+    "nanHandling": "OFF", "language": "FASTEXPR", "visualization": False,
+}
+
+# Alpha 表达式模板中与因子无关的前后缀，因子插入在 ts_rank(...) 中：
+# trade_when(volume>adv20, group_neutralize(<alpha_signal>, <neutralization_group>), -1)
+_EXPRESSION_PREFIX = (
+    "trade_when(volume>adv20,"
+    "group_neutralize(rank("
+    "group_rank(ts_decay_linear(volume/ts_sum(volume,252),10),market)*"
+    # MODIFICATION: vec_avg is removed as we are only using MATRIX types
+    "group_rank(ts_rank("
+)
+_EXPRESSION_SUFFIX = (
+    ", 252),market)*"
+    "group_rank(-ts_delta(close,5),market)"
+    "),"
+    "bucket(rank(cap),range='0,1,0.1')),"
+    "-1)"
+)
+
+
+def setup_logging():
+    """
+    配置独立运行时的日志：只在入口处调用一次，而不是每次实例化时调用。
+    作为模块被 main.py 导入时由 main.py 自行配置日志，这里不做任何事
+    """
+    if logging.getLogger().handlers:
+        return
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler('alpha_creator.log', encoding='utf-8'),
+            logging.StreamHandler()  # 同时输出到控制台，替代原先重复的 print
+        ]
+    )
+
+
+def _settings_encoder():
+    """
+    返回按对象缓存的 settings 序列化函数：settings 通常被所有 Alpha 共享，只需 json.dumps 一次。
+    缓存中同时持有对象引用，防止流式输入时对象被回收后 id 被复用
+    """
+    cache = {}
+
+    def encode(settings):
+        key = id(settings)
+        if key not in cache:
+            cache[key] = (settings, json.dumps(settings))
+        return cache[key][1]
+
+    return encode
 
 
 class AlphaCreator:
@@ -15,16 +89,13 @@ class AlphaCreator:
         self.password = password
         self.session = None
         self.alpha_list = []
+        self.alpha_count = 0
         
-        logging.basicConfig(
-            filename='alpha_creator.log', 
-            level=logging.INFO,
-            format='%(asctime)s - %(levelname)s - %(message)s',
-            encoding='utf-8'
-        )
-        
-    def sign_in(self, retries=3, delay=5):
-        # ... (此部分与您之前的代码完全相同，保持不变) ...
+    def sign_in(self, retries=3, initial_delay=0.5, max_delay=8):
+        """
+        登录 WorldQuant Brain。失败时按指数退避（带随机抖动）重试；
+        401/403 表示凭证错误，重试也不会成功，直接放弃
+        """
         for i in range(retries):
             try:
                 if not self.username or not self.password:
@@ -33,30 +104,68 @@ class AlphaCreator:
                     self.username, self.password = credentials
                 
                 sess = requests.Session()
+                # 连接池需覆盖 get_datafields 的并发分页，保证 TCP/TLS 连接复用
+                adapter = HTTPAdapter(
+                    pool_connections=32, pool_maxsize=32,
+                    max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+                )
+                sess.mount('https://', adapter)
+
+                # 上次登录的会话 cookie 仍有效时直接复用，省去一次认证往返
+                if i == 0 and load_cached_session(sess, self.username):
+                    logger.info("Reusing cached WorldQuant Brain session.")
+                    self.session = sess
+                    return sess
+
                 sess.auth = HTTPBasicAuth(self.username, self.password)
-                
                 response = sess.post('https://api.worldquantbrain.com/authentication')
                 response.raise_for_status()
                 
-                logging.info("Successfully logged into WorldQuant Brain API")
-                print(f"Login status code: {response.status_code}")
-                print(response.json())
+                logger.info("Successfully logged into WorldQuant Brain API (status %s)", response.status_code)
+                logger.debug("Authentication response: %s", response.text)
+                save_session_cache(sess, self.username, response)
+                drop_basic_auth(sess)
                 
                 self.session = sess
                 return sess
                 
+            except requests.exceptions.HTTPError as e:
+                logger.error("Login failed: %s", e)
+                if e.response is not None and e.response.status_code in (401, 403):
+                    logger.error("Invalid credentials, not retrying.")
+                    return None
             except Exception as e:
-                logging.error(f"Login failed: {str(e)}")
-                if i < retries - 1:
-                    time.sleep(delay)
+                logger.error("Login failed: %s", e)
+
+            if i < retries - 1:
+                time.sleep(random.uniform(0, min(max_delay, initial_delay * 2 ** i)))
         
-        logging.error(f"Failed to log in after {retries} attempts.")
+        logger.error("Failed to log in after %d attempts.", retries)
         return None
     
-    def get_datafields(self, search_scope, dataset_id=''):
-        # ... (此部分与您之前的代码完全相同，保持不变) ...
+    def get_datafields(self, search_scope, dataset_id='', max_workers=16, as_records=False,
+                       use_cache=True, cache_ttl=24 * 3600):
+        """
+        获取数据字段。as_records=True 时直接返回 list[dict]，跳过 DataFrame 构造；
+        use_cache=True 时优先读取 cache_ttl 秒内的本地缓存，避免每次运行都重新拉取
+        """
+        cache_path = self._datafields_cache_path(search_scope, dataset_id) if use_cache else None
+        records = self._load_datafields_cache(cache_path, cache_ttl) if cache_path else None
+
+        if records is None:
+            records = self._fetch_datafields(search_scope, dataset_id, max_workers)
+            if records is None:
+                return None
+            if cache_path and records:
+                self._save_datafields_cache(cache_path, records)
+
+        logger.info("Retrieved %d data fields for dataset '%s'.", len(records), dataset_id)
+        return records if as_records else pd.DataFrame.from_records(records)
+
+    def _fetch_datafields(self, search_scope, dataset_id, max_workers):
+        """从 API 分页拉取数据字段，返回扁平的 list[dict]；失败时返回 None"""
         if not self.session:
-            logging.error("Please sign in first.")
+            logger.error("Please sign in first.")
             return None
             
         instrument_type = search_scope['instrumentType']
@@ -64,120 +173,165 @@ class AlphaCreator:
         delay = search_scope['delay']
         universe = search_scope['universe']
         
-        url_template = ("https://api.worldquantbrain.com/data-fields?"
-                      f"&instrumentType={instrument_type}"
-                      f"&region={region}&delay={str(delay)}&universe={universe}&dataset.id={dataset_id}&limit=50"
-                      "&offset={x}")
+        # 固定的查询参数只编码一次，每页只拼接变化的 offset
+        base_url = "https://api.worldquantbrain.com/data-fields?" + urlencode({
+            'instrumentType': instrument_type, 'region': region, 'delay': str(delay),
+            'universe': universe, 'dataset.id': dataset_id, 'limit': 50,
+        })
         try:
-            count_response = self.session.get(url_template.format(x=0))
+            count_response = self.session.get(f"{base_url}&offset=0")
             count_response.raise_for_status()
-            count = count_response.json().get('count', 0)
+            first_page = json.loads(count_response.content)
+            count = first_page.get('count', 0)
             if count == 0:
-                return pd.DataFrame()
+                return []
 
-            datafields_list = []
-            for x in range(0, count, 50):
-                datafields_response = self.session.get(url_template.format(x=x))
-                datafields_response.raise_for_status()
-                datafields_list.append(datafields_response.json()['results'])
-            
-            datafields_list_flat = [item for sublist in datafields_list for item in sublist]
-            datafields_df = pd.DataFrame(datafields_list_flat)
+            # 第一页已在探测 count 时取回，其余分页并发请求（I/O 密集，线程足够）
+            datafields_list = [first_page['results']]
+            page_urls = [f"{base_url}&offset={x}" for x in range(50, count, 50)]
+            with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+                datafields_list.extend(executor.map(self._fetch_page, page_urls))
             
-            logging.info(f"Retrieved {len(datafields_df)} data fields for dataset '{dataset_id}'.")
-            return datafields_df
+            return list(chain.from_iterable(datafields_list))
         except Exception as e:
-            logging.error(f"Failed to fetch datafields for dataset '{dataset_id}': {e}")
+            logger.error("Failed to fetch datafields for dataset '%s': %s", dataset_id, e)
             return None
+
+    def _datafields_cache_path(self, search_scope, dataset_id):
+        key_source = json.dumps({**search_scope, 'dataset_id': dataset_id}, sort_keys=True)
+        key = hashlib.sha256(key_source.encode()).hexdigest()
+        return os.path.join(expanduser(DATAFIELDS_CACHE_DIR), f"{key}.json")
+
+    def _load_datafields_cache(self, cache_path, cache_ttl):
+        """读取未过期的缓存；缓存不存在、已过期或损坏时返回 None"""
+        try:
+            if time.time() - os.path.getmtime(cache_path) >= cache_ttl:
+                return None
+            with open(cache_path, 'rb') as f:
+                records = json.loads(f.read())
+            logger.info("Loaded data fields from cache: %s", cache_path)
+            return records
+        except (OSError, ValueError):
+            return None
+
+    def _save_datafields_cache(self, cache_path, records):
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            temp_path = cache_path + '.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(records, f)
+            os.replace(temp_path, cache_path)
+        except OSError as e:
+            logger.warning("Failed to write data fields cache %s: %s", cache_path, e)
     
+    def _fetch_page(self, url):
+        """拉取一页 data-fields 结果（供线程池调用，Session 的连接池是线程安全的）"""
+        response = self.session.get(url)
+        response.raise_for_status()
+        return json.loads(response.content)['results']
+
     def generate_alpha_expressions(self, fundamental_factors):
         """
         Generates Alpha expressions based on the advanced multi-factor template.
         This version is now simplified to only handle MATRIX-type factors.
         """
-        alpha_expressions = []
-        
-        print(f"Generating expressions for {len(fundamental_factors)} MATRIX-type factors...")
-        
-        for factor in fundamental_factors:
-            # The core logic for the alpha signal
-            alpha_signal = (
-                "rank("
-                "group_rank(ts_decay_linear(volume/ts_sum(volume,252),10),market)*"
-                # MODIFICATION: vec_avg is removed as we are only using MATRIX types
-                f"group_rank(ts_rank({factor}, 252),market)*" 
-                "group_rank(-ts_delta(close,5),market)"
-                ")"
-            )
-            
-            neutralization_group = "bucket(rank(cap),range='0,1,0.1')"
-            
-            # The final expression with the trade_when wrapper
-            final_expression = (
-                f"trade_when(volume>adv20,"
-                f"group_neutralize({alpha_signal},{neutralization_group}),"
-                f"-1)"
-            )
-            
-            alpha_expressions.append(final_expression)
+        logger.info("Generating expressions for %d MATRIX-type factors...", len(fundamental_factors))
 
-        logging.info(f"Generated {len(alpha_expressions)} Alpha expressions.")
-        print(f"There are {len(alpha_expressions)} Alphas to simulate")
+        alpha_expressions = list(self.iter_alpha_expressions(fundamental_factors))
+
+        logger.info("Generated %d Alpha expressions to simulate.", len(alpha_expressions))
         
         return alpha_expressions
+
+    def iter_alpha_expressions(self, fundamental_factors):
+        """逐个生成 Alpha 表达式，流式写出时不必先构造整个表达式列表"""
+        # 单个 f-string 编译为一次 BUILD_STRING，只分配一次结果字符串（a + b + c 会产生中间字符串）
+        for factor in fundamental_factors:
+            yield f"{_EXPRESSION_PREFIX}{factor}{_EXPRESSION_SUFFIX}"
     
+    def iter_alphas(self, alpha_expressions):
+        """逐个生成 Alpha 对象，供 save_alphas_to_csv 流式写出而无需先物化整个列表"""
+        # 设置对所有 Alpha 相同且下游只读，构造一次后按引用共享
+        settings = {**_BASE_SETTINGS, "neutralization": "SUBINDUSTRY"}
+        for expression in alpha_expressions:
+            yield {"type": "REGULAR", "settings": settings, "regular": expression}
+
     def create_alpha_list(self, alpha_expressions):
         # ... (此部分与您之前的代码完全相同，保持不变) ...
-        alpha_list = []
-        for index, expression in enumerate(alpha_expressions, start=1):
-            if index > 0 and index % 5000 == 0:
-                print(f"Processing the {index}-th Alpha object.")
-                
-            simulation_data = {
-                "type": "REGULAR",
-                "settings": {
-                    "instrumentType": "EQUITY", "region": "USA", "universe": "TOP3000",
-                    "delay": 1, "decay": 0, "neutralization": "SUBINDUSTRY",
-                    "truncation": 0.01, "pasteurization": "ON", "unitHandling": "VERIFY",
-                    "nanHandling": "OFF", "language": "FASTEXPR", "visualization": False,
-                },
-                "regular": expression
-            }
-            alpha_list.append(simulation_data)
+        alpha_list = list(self.iter_alphas(alpha_expressions))
         
         self.alpha_list = alpha_list
-        logging.info(f"Created {len(alpha_list)} Alpha objects.")
-        print(f"Created {len(alpha_list)} Alpha objects.")
+        self.alpha_count = len(alpha_list)
+        logger.info("Created %d Alpha objects.", len(alpha_list))
         return alpha_list
     
-    def save_alphas_to_csv(self, filename='alpha_list_pending_simulated.csv'):
-        # ... (此部分与您之前的代码完全相同，保持不变) ...
-        if not self.alpha_list:
-            logging.error("Alpha list is empty.")
-            return False
+    def save_alphas_to_csv(self, filename='alpha_list_pending_simulated.csv', alphas=None):
+        """
+        保存 Alpha 到 CSV。alphas 可以是任意可迭代对象（如 iter_alphas 生成器），
+        为 None 时写出 self.alpha_list
+        """
+        if alphas is None:
+            alphas = self.alpha_list
+            if not alphas:
+                logger.error("Alpha list is empty.")
+                return False
         
         try:
-            with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-                fieldnames = ['type', 'settings', 'regular']
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-                writer.writeheader()
-                
-                for alpha in self.alpha_list:
-                    writable_alpha = alpha.copy()
-                    writable_alpha['settings'] = json.dumps(writable_alpha['settings'])
-                    writer.writerow(writable_alpha)
+            encode_settings = _settings_encoder()
+            row_count = 0
+
+            def rows():
+                nonlocal row_count
+                for alpha in alphas:
+                    row_count += 1
+                    yield alpha['type'], encode_settings(alpha['settings']), alpha['regular']
+
+            # 1MB 写缓冲：逐行 writerows 产生的小块写入合并为少量系统调用
+            with open(filename, 'w', newline='', encoding='utf-8', buffering=1 << 20) as csvfile:
+                writer = csv.writer(csvfile)
+                writer.writerow(['type', 'settings', 'regular'])
+                writer.writerows(rows())
             
-            logging.info(f"Successfully saved {len(self.alpha_list)} Alphas to file {filename}.")
+            self.alpha_count = row_count
+            logger.info("Successfully saved %d Alphas to file %s.", row_count, filename)
             return True
             
         except Exception as e:
-            logging.error(f"Failed to save CSV file: {str(e)}")
+            logger.error("Failed to save CSV file: %s", e)
             return False
 
-    def create_and_save_alphas(self, filename='alphas_for_matrix_factors.csv'):
+    def save_alphas_to_ndjson(self, filename='alpha_list_pending_simulated.ndjson', alphas=None):
+        """
+        以 NDJSON（每行一个 JSON 对象）保存 Alpha：settings 不再作为 CSV 中嵌套的 JSON 字符串
+        被二次转义，文件更小、解析更快。alphas 的含义与 save_alphas_to_csv 相同
+        """
+        if alphas is None:
+            alphas = self.alpha_list
+            if not alphas:
+                logger.error("Alpha list is empty.")
+                return False
+
+        try:
+            row_count = 0
+            with open(filename, 'w', encoding='utf-8', buffering=1 << 20) as f:
+                for alpha in alphas:
+                    record = {"type": alpha["type"], "settings": alpha["settings"], "regular": alpha["regular"]}
+                    f.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n')
+                    row_count += 1
+
+            self.alpha_count = row_count
+            logger.info("Successfully saved %d Alphas to file %s.", row_count, filename)
+            return True
+
+        except Exception as e:
+            logger.error("Failed to save NDJSON file: %s", e)
+            return False
+
+    def create_and_save_alphas(self, filename='alphas_for_matrix_factors.csv', materialize=True):
         """
         A complete workflow that now ONLY tests for MATRIX-type factors.
         MODIFICATION: Method signature now accepts a filename to fix the TypeError.
+        materialize=False 时 Alpha 直接流式写入 CSV，不保留 self.alpha_list（只记录 self.alpha_count）
         """
         search_scope = {
             'region': 'USA', 'delay': '1', 'universe': 'TOP3000', 'instrumentType': 'EQUITY'
@@ -187,45 +341,53 @@ class AlphaCreator:
             if not self.sign_in():
                 return False
 
-            print("Getting data fields from 'fundamental6' and 'fundamental2' datasets...")
-            fundamental6_df = self.get_datafields(search_scope, dataset_id='fundamental6')
-            fundamental2_df = self.get_datafields(search_scope, dataset_id='fundamental2')
+            logger.info("Getting data fields from 'fundamental6' and 'fundamental2' datasets...")
+            # 两个数据集互不依赖，同时拉取，让两边的分页请求在网络上重叠
+            with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+                fundamental6_future = executor.submit(self.get_datafields, search_scope, 'fundamental6', as_records=True)
+                fundamental2_future = executor.submit(self.get_datafields, search_scope, 'fundamental2', as_records=True)
+                fundamental6_records = fundamental6_future.result() or []
+                fundamental2_records = fundamental2_future.result() or []
             
-            all_factors_df = pd.concat([fundamental6_df, fundamental2_df], ignore_index=True).drop_duplicates(subset=['id'])
-
-            if all_factors_df.empty:
-                logging.error("No data fields found. Aborting.")
+            if not fundamental6_records and not fundamental2_records:
+                logger.error("No data fields found. Aborting.")
                 return False
 
+            # 一次遍历完成去重与筛选：按 id 去重（保留首次出现，与原 drop_duplicates(subset=['id']) 语义一致）
             # --- MODIFICATION: Only processing MATRIX type fields ---
-            matrix_fields = all_factors_df[all_factors_df['type'] == "MATRIX"]
-            if matrix_fields.empty:
-                logging.error("No MATRIX type data fields found. Aborting.")
+            seen_ids = set()
+            matrix_factor_list = []
+            for record in chain(fundamental6_records, fundamental2_records):
+                factor_id = record['id']
+                if factor_id in seen_ids:
+                    continue
+                seen_ids.add(factor_id)
+                if record.get('type') == "MATRIX":
+                    matrix_factor_list.append(factor_id)
+
+            if not matrix_factor_list:
+                logger.error("No MATRIX type data fields found. Aborting.")
                 return False
                 
-            matrix_factor_list = matrix_fields['id'].tolist()
-            print(f"Found a total of {len(matrix_factor_list)} unique MATRIX-type data fields to test.")
+            logger.info("Found a total of %d unique MATRIX-type data fields to test.", len(matrix_factor_list))
 
-            print("Generating Alpha expressions for MATRIX factors...")
-            alpha_expressions = self.generate_alpha_expressions(matrix_factor_list)
-            
-            print("Creating Alpha objects...")
-            self.create_alpha_list(alpha_expressions)
-            
-            print(f"Saving to CSV file: {filename}")
-            if self.save_alphas_to_csv(filename):
-                 print(f"Successfully saved {len(self.alpha_list)} Almas to file {filename}.")
-                 return True
+            if materialize:
+                self.create_alpha_list(self.generate_alpha_expressions(matrix_factor_list))
+                alphas = None
             else:
-                 print(f"Failed to save alphas to {filename}.")
-                 return False
+                # 因子 -> 表达式 -> Alpha -> CSV 行在一次遍历中完成，不保留任何长度为 N 的中间列表
+                alphas = self.iter_alphas(self.iter_alpha_expressions(matrix_factor_list))
+            
+            logger.info("Saving to CSV file: %s", filename)
+            return self.save_alphas_to_csv(filename, alphas)
             
         except Exception as e:
-            logging.error(f"An error occurred during the Alpha creation process: {e}", exc_info=True)
+            logger.error("An error occurred during the Alpha creation process: %s", e, exc_info=True)
             return False
 
 
 if __name__ == "__main__":
+    setup_logging()
     creator = AlphaCreator()
     # MODIFICATION: Calling the method correctly with the desired filename
     success = creator.create_and_save_alphas(filename='alpha_list_pending_simulated.csv')
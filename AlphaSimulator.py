@@ -1,12 +1,39 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import logging
 import time
 import csv
 import os
+import shutil
 import json
+import threading
+import atexit
+import concurrent.futures
+from collections import deque
+from functools import lru_cache
 from datetime import datetime
 
+from brain_session import drop_basic_auth, load_cached_session, refresh_session, save_session_cache
+
+@lru_cache(maxsize=256)
+def _parse_settings(settings_raw):
+    """
+    解析 settings JSON。各行的 settings 字符串通常完全相同，按原始字符串缓存后
+    同样的设置在所有批次中只解析一次，各行共享同一个 dict（下游只读，不会修改它）
+    """
+    return json.loads(settings_raw)
+
+# 以预先序列化的 JSON 请求体 POST 时使用的请求头
+JSON_HEADERS = {'Content-Type': 'application/json'}
+
 class AlphaSimulator:
+    FLUSH_EVERY = 50  # 缓冲的结果行数达到该值时落盘（每轮轮询结束时也会落盘）
+    DEFAULT_POLL_INTERVAL = 5  # 服务端未给出 Retry-After 时的轮询间隔（秒）
+    MAX_IDLE_INTERVAL = 30  # 没有进行中的模拟时，指数退避的最长等待（秒）
+    MIN_POLL_INTERVAL = 1  # 按 Retry-After 轮询时的最短间隔（秒），避免服务端给出极小值时空转
+    MAX_POLL_INTERVAL = 30  # 按 Retry-After 轮询时的最长间隔（秒），避免过大的值拖慢补位
+
     def __init__(self, max_concurrent, username, password, alpha_list_file_path, batch_number_for_every_queue):
         self.fail_alphas = 'fail_alphas.csv'
         self.simulated_alphas = f'simulated_alphas_{datetime.now().strftime("%Y%m%d")}.csv'
@@ -14,13 +41,80 @@ class AlphaSimulator:
         self.active_simulations = []
         self.username = username
         self.password = password
+        self._sign_in_lock = threading.Lock()  # 并发轮询时保证同一时间只有一个线程重新登录
         self.session = self.sign_in(username, password)
         self.alpha_list_file_path = alpha_list_file_path
-        self.sim_queue_ls = []
+        self.offset_file_path = alpha_list_file_path + '.offset'
+        # 读取进度（含后台预读）与已提交进度分开记录：sidecar 只写入已提交进度，
+        # 中断后重启时仍在队列中、或已预读但未提交的 Alpha 会被重新读取
+        self._offset_lock = threading.Lock()
+        self._load_offset()
+        self.sim_queue_ls = deque()
         self.batch_number_for_every_queue = batch_number_for_every_queue
 
+        # 结果文件在第一次写入时才打开（没有结果就不会产生空文件），之后在整个生命周期内保持打开；
+        # 行写入先进入缓冲区，按 FLUSH_EVERY 行 / 每轮轮询 / 退出时落盘
+        self._fail_fh = None
+        self._done_fh = None
+        self._done_writer = None
+        self._unflushed_rows = 0
+        # 轮询线程池在整个生命周期内复用，避免每轮轮询都创建、销毁线程
+        self._poll_pool = concurrent.futures.ThreadPoolExecutor(max_workers=min(32, max_concurrent))
+        # 单线程 I/O 池：在当前批次耗尽前后台预读下一批，读文件（以及偶尔的压缩）不再阻塞提交
+        self._io_pool = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self._refill_future = None
+        atexit.register(self.close)
+
+    def _row_written(self):
+        self._unflushed_rows += 1
+        if self._unflushed_rows >= self.FLUSH_EVERY:
+            self.flush()
+
+    @staticmethod
+    def _open_result_file(path, buffering):
+        """以追加方式打开结果文件，返回 (文件对象, 是否需要写表头)"""
+        fh = open(path, 'a', newline='', buffering=buffering)
+        return fh, fh.tell() == 0
+
+    def flush(self):
+        """把缓冲中的失败/完成记录写入磁盘（fsync，进程崩溃或断电也不会丢失已落盘的行）"""
+        for fh in (self._fail_fh, self._done_fh):
+            if fh is not None and not fh.closed:
+                fh.flush()
+                os.fsync(fh.fileno())
+        self._unflushed_rows = 0
+
+    def close(self):
+        """刷新并关闭结果文件、停止轮询线程池（可重复调用）"""
+        self._poll_pool.shutdown(wait=False)
+        self._io_pool.shutdown(wait=True)
+        self.flush()
+        for fh in (self._fail_fh, self._done_fh):
+            if fh is not None:
+                fh.close()
+
     def sign_in(self, username, password):
         s = requests.Session()
+        # 复用 keep-alive 连接；GET 遇到 429/5xx 由适配器按 Retry-After 或指数退避自动重试。
+        # POST（创建模拟）不由适配器重试：网关 5xx 时请求可能已被受理，重发会产生重复模拟；
+        # 其 429 由 simulate_alpha 按 Retry-After 等待。raise_on_status=False 保证重试耗尽后仍交给 raise_for_status 处理
+        # 连接池不小于最大并发数，保证并发轮询时每个线程都能拿到复用的连接
+        adapter = HTTPAdapter(
+            pool_connections=16, pool_maxsize=max(32, self.max_concurrent),
+            max_retries=Retry(
+                total=5, backoff_factor=1.5, status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=frozenset(['GET']), respect_retry_after_header=True,
+                raise_on_status=False
+            )
+        )
+        s.mount('https://', adapter)
+        s.headers['Connection'] = 'keep-alive'
+
+        # 上次登录的会话 cookie 仍有效时直接复用，省去一次认证往返
+        if load_cached_session(s, username):
+            logging.info("Reusing cached BRAIN session.")
+            return s
+
         s.auth = (username, password)
         count = 0
         count_limit = 5
@@ -29,6 +123,8 @@ class AlphaSimulator:
                 response = s.post('https://api.worldquantbrain.com/authentication')
                 response.raise_for_status()
                 logging.info("Login to BRAIN successfully.")
+                save_session_cache(s, username, response)
+                drop_basic_auth(s)
                 return s
             except requests.exceptions.RequestException as e:
                 count += 1
@@ -38,44 +134,146 @@ class AlphaSimulator:
         logging.error(f"{username} failed to log in after {count_limit} attempts. Returning None.")
         return None
 
+    def _refresh_session(self, stale_session):
+        """会话过期时重新登录（线程安全）。若其它线程已经换过会话，直接复用新会话而不重复登录"""
+        return refresh_session(self, stale_session, lambda: self.sign_in(self.username, self.password),
+                               self._sign_in_lock)
+
+    def _load_offset(self):
+        """
+        读取待回测文件的已提交进度（sidecar 文件），读取进度从这里开始。
+        记录中的 mtime/大小与当前文件不一致时说明文件已被重新生成，从头开始读取
+        """
+        try:
+            with open(self.offset_file_path, 'r') as f:
+                state = json.load(f)
+            self._pending_file_state = (state['mtime_ns'], state['size'])
+            self._offset = state['offset']
+        except (OSError, ValueError, KeyError, TypeError):
+            self._pending_file_state = None
+            self._offset = 0
+        self._committed_offset = self._offset
+        # 队列中的每个 Alpha 记录 (文件代数, 逻辑结束位置)。逻辑位置 = 文件内位置 + 压缩累计删除的字节数，
+        # 压缩后仍能换算回文件内位置；文件被重新生成时代数加一，旧文件的行不再更新进度
+        self._file_shift = 0
+        self._file_generation = 0
+
+    def _save_offset(self):
+        """原子地写回已提交进度，避免中途崩溃留下损坏的 sidecar 文件（调用方持有 _offset_lock）"""
+        mtime_ns, size = self._pending_file_state
+        temp_file_name = self.offset_file_path + '.tmp'
+        with open(temp_file_name, 'w') as f:
+            json.dump({'offset': self._committed_offset, 'mtime_ns': mtime_ns, 'size': size}, f)
+        os.replace(temp_file_name, self.offset_file_path)
+
+    def _commit_offset(self, pending_pos):
+        """Alpha 已提交（或已记入失败文件）后，把已提交进度推进到它所在行的末尾"""
+        generation, logical_end = pending_pos
+        with self._offset_lock:
+            if generation != self._file_generation:
+                return
+            self._committed_offset = logical_end - self._file_shift
+            self._save_offset()
+
+    def _sync_pending_file_state(self):
+        """待回测文件被替换或改写时重置读取与提交进度；返回当前文件的 stat 结果"""
+        st = os.stat(self.alpha_list_file_path)
+        with self._offset_lock:
+            if (st.st_mtime_ns, st.st_size) != self._pending_file_state:
+                self._pending_file_state = (st.st_mtime_ns, st.st_size)
+                self._offset = self._committed_offset = self._file_shift = 0
+                self._file_generation += 1
+        return st
+
+    def has_pending_alphas(self):
+        """待回测文件中是否还有未读取的行"""
+        try:
+            st = os.stat(self.alpha_list_file_path)
+        except FileNotFoundError:
+            return False
+        offset = self._offset if (st.st_mtime_ns, st.st_size) == self._pending_file_state else 0
+        return offset < st.st_size
+
+    def _compact_pending_file(self, header_end):
+        """
+        已提交部分超过文件一半时，把表头和未提交部分写入临时文件并原子替换原文件，已提交进度回到表头之后。
+        每次压缩复制的字节数不超过已提交的字节数，整体仍是线性 I/O；
+        若在替换后、写回 sidecar 前崩溃，stat 不一致会使下次从新文件开头读取，不会丢行。
+        调用方持有 _offset_lock
+        """
+        temp_file_name = self.alpha_list_file_path + '.tmp'
+        with open(self.alpha_list_file_path, 'rb') as src, open(temp_file_name, 'wb') as dst:
+            dst.write(src.read(header_end))
+            src.seek(self._committed_offset)
+            shutil.copyfileobj(src, dst, 1 << 20)
+        os.replace(temp_file_name, self.alpha_list_file_path)
+        st = os.stat(self.alpha_list_file_path)
+        removed = self._committed_offset - header_end
+        self._pending_file_state = (st.st_mtime_ns, st.st_size)
+        self._file_shift += removed
+        self._offset -= removed
+        self._committed_offset = header_end
+        self._save_offset()
+
+    @staticmethod
+    def _read_csv_record(f):
+        """读取一条完整的 CSV 记录（引号内的换行会一并读入），到达文件末尾时返回空串"""
+        record = f.readline()
+        while record and record.count(b'"') % 2:
+            line = f.readline()
+            if not line:
+                break
+            record += line
+        return record.decode('utf-8')
+
     def read_alphas_from_csv_in_batches(self, batch_size=50):
-        alphas = []
-        if not os.path.exists(self.alpha_list_file_path):
+        """
+        从上次停下的字节偏移处继续读取下一批 Alpha（以 deque 返回）。
+        文件本身不再改写：读取只推进内存中的读取位置，每批只读取 batch_size 行；
+        每行记下自己的结束位置（_pending_pos），提交后由 _commit_offset 写入 <文件名>.offset
+        """
+        alphas = deque()  # 调用方从队首逐个取出，popleft 为 O(1)
+        try:
+            # 一次 stat 同时完成存在性检查和进度校验
+            self._sync_pending_file_state()
+        except FileNotFoundError:
             return alphas
             
-        temp_file_name = self.alpha_list_file_path + '.tmp'
         try:
-            with open(self.alpha_list_file_path, 'r', newline='') as file, open(temp_file_name, 'w', newline='') as temp_file:
-                reader = csv.DictReader(file)
-                fieldnames = reader.fieldnames
+            with open(self.alpha_list_file_path, 'rb') as file:
+                fieldnames = next(csv.reader([self._read_csv_record(file)]), None)
                 if not fieldnames:
-                    return []
-                
-                writer = csv.DictWriter(temp_file, fieldnames=fieldnames)
-                writer.writeheader()
-                
-                for _ in range(batch_size):
-                    try:
-                        row = next(reader)
-                        if 'settings' in row and isinstance(row['settings'], str):
-                            try:
-                                row['settings'] = json.loads(row['settings'])
-                            except json.JSONDecodeError:
-                                logging.error(f"Error decoding settings JSON: {row['settings']}")
-                                continue
-                        alphas.append(row)
-                    except StopIteration:
+                    return alphas
+                header_end = file.tell()
+                file.seek(max(self._offset, header_end))
+                generation, shift = self._file_generation, self._file_shift
+
+                while len(alphas) < batch_size:
+                    record = self._read_csv_record(file)
+                    if not record:
                         break
-                
-                for remaining_row in reader:
-                    writer.writerow(remaining_row)
+                    values = next(csv.reader([record]), None)
+                    if not values:
+                        continue
+                    row = dict(zip(fieldnames, values))
+                    if 'settings' in row and isinstance(row['settings'], str):
+                        try:
+                            # 原始字符串一并保留：失败记录直接写回它，不必再 json.dumps
+                            row['_settings_raw'] = row['settings']
+                            row['settings'] = _parse_settings(row['settings'])
+                        except json.JSONDecodeError:
+                            logging.error(f"Error decoding settings JSON: {row['settings']}")
+                            continue
+                    row['_pending_pos'] = (generation, file.tell() + shift)
+                    alphas.append(row)
 
-            os.replace(temp_file_name, self.alpha_list_file_path)
+                self._offset = file.tell()
+            with self._offset_lock:
+                if self._committed_offset - header_end > self._pending_file_state[1] // 2:
+                    self._compact_pending_file(header_end)
 
         except Exception as e:
             logging.error(f"An unexpected error occurred in read_alphas_from_csv_in_batches: {e}")
-            if os.path.exists(temp_file_name):
-                os.remove(temp_file_name)
 
         return alphas
 
@@ -83,22 +281,25 @@ class AlphaSimulator:
         """Sends a simulation request with robust retry logic for 401 and 429 errors."""
         max_retries = 5
         attempt = 0
+        # 请求体只序列化一次，重试（401 重新登录、429 等待）时直接复用
+        body = json.dumps({k: v for k, v in alpha.items() if k != '_settings_raw'}).encode('utf-8')
         while attempt < max_retries:
+            session = self.session
             try:
-                response = self.session.post('https://api.worldquantbrain.com/simulations', json=alpha)
+                response = session.post('https://api.worldquantbrain.com/simulations', data=body, headers=JSON_HEADERS)
                 response.raise_for_status()
                 return response.headers.get("location") # Success
             except requests.exceptions.HTTPError as e:
                 status_code = e.response.status_code
                 if status_code == 401:
                     logging.warning("Session expired (401 Unauthorized). Re-logging in...")
-                    self.session = self.sign_in(self.username, self.password)
-                    if not self.session:
+                    if not self._refresh_session(session):
                         logging.error("Failed to re-login. Aborting this alpha.")
                         break
                     logging.info("Re-login successful. Retrying simulation request...")
                     continue
                 elif status_code == 429:
+                    # 并发模拟数已满时 BRAIN 返回 429，可能持续数分钟：等待后重试，不计入失败次数
                     retry_after = int(e.response.headers.get("Retry-After", 60))
                     logging.warning(f"Rate limited (429 Too Many Requests). Waiting for {retry_after} seconds...")
                     time.sleep(retry_after)
@@ -119,47 +320,71 @@ class AlphaSimulator:
     def log_failed_alpha(self, alpha):
         logging.error(f"Logging failed alpha: {alpha.get('regular')}")
         try:
-            if 'settings' in alpha and isinstance(alpha['settings'], dict):
+            settings_raw = alpha.pop('_settings_raw', None)
+            if settings_raw is not None:
+                alpha['settings'] = settings_raw
+            elif 'settings' in alpha and isinstance(alpha['settings'], dict):
                 alpha['settings'] = json.dumps(alpha['settings'])
             
-            file_exists = os.path.isfile(self.fail_alphas)
-            
-            with open(self.fail_alphas, 'a', newline='') as file:
-                writer = csv.DictWriter(file, fieldnames=alpha.keys())
-                if not file_exists:
-                    writer.writeheader()
-                writer.writerow(alpha)
+            if self._fail_fh is None:
+                self._fail_fh, self._fail_needs_header = self._open_result_file(self.fail_alphas, 1 << 16)
+            writer = csv.DictWriter(self._fail_fh, fieldnames=alpha.keys())
+            if self._fail_needs_header:
+                writer.writeheader()
+                self._fail_needs_header = False
+            writer.writerow(alpha)
+            self._row_written()
         except Exception as e:
             logging.error(f"Could not write to fail_alphas.csv: {e}")
 
+    def _take_next_batch(self):
+        """取下一批 Alpha：优先使用后台预读的结果，没有预读时同步读取"""
+        if self._refill_future is not None:
+            batch = self._refill_future.result()
+            self._refill_future = None
+            return batch
+        return self.read_alphas_from_csv_in_batches(self.batch_number_for_every_queue)
+
+    def _maybe_prefetch(self):
+        """队列剩余不足一半并发数、且文件中还有未读行时，后台预读下一批"""
+        if (self._refill_future is None and len(self.sim_queue_ls) <= self.max_concurrent // 2
+                and self.has_pending_alphas()):
+            self._refill_future = self._io_pool.submit(
+                self.read_alphas_from_csv_in_batches, self.batch_number_for_every_queue)
+
     def load_new_alpha_and_simulate(self):
         if not self.sim_queue_ls:
-            self.sim_queue_ls = self.read_alphas_from_csv_in_batches(self.batch_number_for_every_queue)
+            self.sim_queue_ls = self._take_next_batch()
             if not self.sim_queue_ls:
                 return
 
         if len(self.active_simulations) >= self.max_concurrent:
             return
 
-        alpha = self.sim_queue_ls.pop(0)
+        alpha = self.sim_queue_ls.popleft()
+        pending_pos = alpha.pop('_pending_pos', None)
         logging.info(f"Starting simulation for alpha: {alpha.get('regular')}")
         location_url = self.simulate_alpha(alpha)
         if location_url:
             self.active_simulations.append(location_url)
+        # 无论提交成功还是已记入失败文件，这一行都已处理完，可以推进已提交进度
+        if pending_pos is not None:
+            self._commit_offset(pending_pos)
 
     def check_simulation_progress(self, simulation_progress_url):
+        session = self.session
         try:
-            response = self.session.get(simulation_progress_url)
+            response = session.get(simulation_progress_url)
             response.raise_for_status()
             return response
         except requests.exceptions.HTTPError as e:
             if e.response.status_code == 401:
                 logging.warning(f"Session expired (401 Unauthorized) while checking progress. Re-logging in...")
-                self.session = self.sign_in(self.username, self.password)
-                if self.session:
+                session = self._refresh_session(session)
+                if session:
                     logging.info("Re-login successful. Retrying progress check...")
                     try:
-                        response = self.session.get(simulation_progress_url)
+                        response = session.get(simulation_progress_url)
                         response.raise_for_status()
                         return response
                     except requests.exceptions.RequestException as retry_e:
@@ -173,13 +398,37 @@ class AlphaSimulator:
         
         return None
 
+    def fetch_alpha_details(self, alpha_id):
+        """获取已完成 Alpha 的详情（供线程池调用），失败时返回 None"""
+        try:
+            alpha_details_response = self.session.get(f"https://api.worldquantbrain.com/alphas/{alpha_id}")
+            alpha_details_response.raise_for_status()
+            return json.loads(alpha_details_response.content)
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logging.error(f"Failed to fetch details for completed alpha {alpha_id}: {e}")
+            return None
+
     def check_simulation_status(self):
+        """
+        轮询所有进行中的模拟并处理已完成的结果。
+        返回仍在进行的模拟中最小的 Retry-After（秒），没有可参考的值时返回 None
+        """
         if not self.active_simulations:
-            return
+            return None
 
-        for sim_url in self.active_simulations[:]:
-            response = self.check_simulation_progress(sim_url)
-            
+        # 各模拟的进度查询、已完成 Alpha 的详情请求互不依赖，都并发发出：
+        # 一轮轮询耗时从 N×RTT 降为约 1×RTT。进度结果按返回先后处理，
+        # 某个模拟一完成就立即提交其详情请求；结果写入仍在当前线程进行
+        progress_futures = {
+            self._poll_pool.submit(self.check_simulation_progress, sim_url): sim_url
+            for sim_url in self.active_simulations
+        }
+        finished_urls = set()
+        detail_futures = []
+        retry_afters = []
+        for future in concurrent.futures.as_completed(progress_futures):
+            sim_url = progress_futures[future]
+            response = future.result()
             if response is None:
                 logging.warning(f"Could not get status for {sim_url}, will retry next cycle.")
                 continue
@@ -190,32 +439,44 @@ class AlphaSimulator:
             logging.info(f"Checking {sim_url}... Status: {response.status_code}, Retry-After: {retry_after}")
             # --- MODIFICATION END ---
             
-            if retry_after == 0:
-                self.active_simulations.remove(sim_url)
-                sim_result = response.json()
+            if retry_after > 0:
+                retry_afters.append(retry_after)
+            else:
+                finished_urls.add(sim_url)
+                sim_result = json.loads(response.content)
                 alpha_id = sim_result.get("alpha")
                 status = sim_result.get("status", "UNKNOWN")
                 
                 if status == "COMPLETE" and alpha_id:
                     logging.info(f"Simulation {sim_url} completed. Alpha ID: {alpha_id}.")
-                    try:
-                        alpha_details_response = self.session.get(f"https://api.worldquantbrain.com/alphas/{alpha_id}")
-                        alpha_details_response.raise_for_status()
-                        result_data = alpha_details_response.json()
-
-                        file_exists = os.path.isfile(self.simulated_alphas)
-                        with open(self.simulated_alphas, 'a', newline='') as file:
-                            writer = csv.DictWriter(file, fieldnames=result_data.keys())
-                            if not file_exists:
-                                writer.writeheader()
-                            writer.writerow(result_data)
-                    except requests.exceptions.RequestException as e:
-                        logging.error(f"Failed to fetch details for completed alpha {alpha_id}: {e}")
+                    detail_futures.append(self._poll_pool.submit(self.fetch_alpha_details, alpha_id))
                 else:
                     logging.warning(f"Simulation {sim_url} ended with non-COMPLETE status: {status}. Details: {sim_result}")
+
+        # 一次遍历重建仍在进行的列表（逐个 list.remove 每次都是 O(N)），保持原有顺序
+        if finished_urls:
+            self.active_simulations = [u for u in self.active_simulations if u not in finished_urls]
+        all_result_data = [future.result() for future in detail_futures]
+
+        for result_data in all_result_data:
+            if result_data is None:
+                continue
+            if self._done_writer is None:
+                # 列名取自第一条结果并在之后复用；之后结果多出的字段忽略，缺少的字段留空，保持与表头对齐
+                self._done_fh, needs_header = self._open_result_file(self.simulated_alphas, 1 << 20)
+                self._done_writer = csv.DictWriter(self._done_fh, fieldnames=list(result_data), extrasaction='ignore')
+                if needs_header:
+                    self._done_writer.writeheader()
+            # 嵌套字段（如 is、settings）以 JSON 写出，分析脚本可直接 json.loads，而不是 Python 字面量
+            self._done_writer.writerow({
+                key: json.dumps(value) if isinstance(value, (dict, list)) else value
+                for key, value in result_data.items()
+            })
+            self._row_written()
         
         # This log will now be more meaningful after the detailed per-URL logs.
         logging.info(f"{len(self.active_simulations)} simulations still in process for account {self.username}.")
+        return min(retry_afters, default=None)
 
     def manage_simulations(self):
         if not self.session:
@@ -224,26 +485,43 @@ class AlphaSimulator:
         
         logging.info(f"🚀 Starting simulation management... max_concurrent={self.max_concurrent}, batch_size={self.batch_number_for_every_queue}")
         
+        idle_interval = self.DEFAULT_POLL_INTERVAL
         while True:
             try:
-                self.check_simulation_status()
+                next_poll = self.check_simulation_status()
 
                 while len(self.active_simulations) < self.max_concurrent:
                     if not self.sim_queue_ls:
-                        self.sim_queue_ls = self.read_alphas_from_csv_in_batches(self.batch_number_for_every_queue)
+                        self.sim_queue_ls = self._take_next_batch()
                         if not self.sim_queue_ls:
                             break 
                     self.load_new_alpha_and_simulate()
+                self._maybe_prefetch()
                 
-                is_file_present = os.path.exists(self.alpha_list_file_path) and os.path.getsize(self.alpha_list_file_path) > 50
-                if not self.sim_queue_ls and not self.active_simulations and not is_file_present:
+                # 每轮最多丢失一轮的结果：已从待回测文件消费的 Alpha 不能只留在内存缓冲里
+                if self._unflushed_rows:
+                    self.flush()
+
+                if (not self.sim_queue_ls and not self.active_simulations and self._refill_future is None
+                        and not self.has_pending_alphas()):
                      logging.info("All alphas have been simulated. Shutting down.")
                      break
 
-                time.sleep(5)
+                # 有进行中的模拟时按服务端给出的 Retry-After 决定下次轮询（限制在 [MIN, MAX] 内）；
+                # 空闲时（没有进行中的模拟）指数退避，出现新活动后重置
+                if self.active_simulations:
+                    idle_interval = self.DEFAULT_POLL_INTERVAL
+                    if next_poll is None:
+                        next_poll = self.DEFAULT_POLL_INTERVAL
+                    time.sleep(min(max(next_poll, self.MIN_POLL_INTERVAL), self.MAX_POLL_INTERVAL))
+                else:
+                    time.sleep(idle_interval)
+                    idle_interval = min(idle_interval * 2, self.MAX_IDLE_INTERVAL)
             except KeyboardInterrupt:
                 logging.info("⏹️ Simulation process interrupted by user.")
                 break
             except Exception as e:
                 logging.error(f"An unexpected error occurred in the main loop: {e}", exc_info=True)
-                time.sleep(30)
\ No newline at end of file
+                time.sleep(30)
+
+        self.flush()
\ No newline at end of file
@@ -1,14 +1,22 @@
 import requests
+import ast
+import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import logging
 import time
 import csv
-import re
+import sys
 import threading
 import concurrent.futures
-from queue import Queue
+from queue import Queue, Empty
 from datetime import datetime
 from pathlib import Path
 
+# brain_session 位于仓库根目录；本脚本在 analyzer/ 下单独运行，需要把根目录加入模块搜索路径
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from brain_session import refresh_session
+
 # 日志配置 - 新增encoding='utf-8'解决中文乱码
 logging.basicConfig(
     level=logging.INFO,
@@ -19,6 +27,12 @@ logging.basicConfig(
     ]
 )
 
+# 报告中"所有检查通过的Alpha列表"部分的标题
+PASSED_SECTION_TITLE = "## 1. 所有检查通过的Alpha列表"
+
+# 检查结果CSV的列
+RESULT_FIELDNAMES = ['alpha_id', 'result', 'correlation_value', 'limit', 'timestamp', 'error']
+
 class AutoCorrelationChecker:
     def __init__(self, alpha_list_md_path, login_creds_path, max_retry=35, retry_interval=5, thread_count=5):
         self.alpha_list_md_path = alpha_list_md_path
@@ -27,15 +41,24 @@ class AutoCorrelationChecker:
         self.retry_interval = retry_interval
         self.thread_count = thread_count
         self.session = None
+        self._login_creds = None
+        self._auth_lock = threading.Lock()  # 多个检查线程同时遇到 401 时只由一个线程重新登录
         self.result_path = f'self_correlation_results_{datetime.now().strftime("%Y%m%d")}.csv'
-        self.result_lock = threading.Lock()  # 添加锁以保护结果写入
+        self._result_queue = Queue()  # 检查线程只把结果放入队列，由单独的写入线程批量落盘
 
     def load_login_creds(self):
-        """从文件加载登录信息（邮箱+密码）"""
+        """从文件加载登录信息（邮箱+密码），只解析字面量、不执行文件内容；结果缓存在实例上，重新登录时不再读盘"""
+        if self._login_creds is not None:
+            return self._login_creds
         try:
             with open(self.login_creds_path, 'r', encoding='utf-8') as f:  # 读取时指定编码
-                creds = eval(f.read())
-                return creds[0], creds[1]
+                content = f.read()
+            try:
+                creds = json.loads(content)
+            except ValueError:
+                creds = ast.literal_eval(content)  # 兼容 Python 字面量写法（如单引号）
+            self._login_creds = (creds[0], creds[1])
+            return self._login_creds
         except Exception as e:
             logging.error(f"加载登录信息失败: {e}")
             raise
@@ -44,6 +67,16 @@ class AutoCorrelationChecker:
         """登录WorldQuant平台，建立会话"""
         username, password = self.load_login_creds()
         session = requests.Session()
+        # 检查线程共享会话：连接池覆盖所有线程以复用 keep-alive 连接，429/5xx 由适配器退避重试
+        adapter = HTTPAdapter(
+            pool_connections=self.thread_count * 2, pool_maxsize=self.thread_count * 2,
+            max_retries=Retry(
+                total=5, backoff_factor=1.5, status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=frozenset(['GET', 'POST']), respect_retry_after_header=True,
+                raise_on_status=False
+            )
+        )
+        session.mount('https://', adapter)
         session.auth = (username, password)
         count = 0
         count_limit = 30
@@ -60,6 +93,10 @@ class AutoCorrelationChecker:
         logging.error("登录失败次数过多，终止程序")
         return None
 
+    def _refresh_session(self, stale_session):
+        """会话过期时重新登录（线程安全）。若其它线程已经换过会话，直接复用新会话而不重复登录"""
+        return refresh_session(self, stale_session, self.sign_in, self._auth_lock)
+
     def extract_alpha_ids(self):
         """从alpha_analysis_report.md文件的'所有检查通过的Alpha列表'部分提取Alpha ID"""
         ids = []
@@ -67,15 +104,12 @@ class AutoCorrelationChecker:
             with open(self.alpha_list_md_path, 'r', encoding='utf-8') as f:  # 读取时指定编码
                 content = f.read()
             
-            # 查找"## 1. 所有检查通过的Alpha列表"部分
-            section_start = content.find("## 1. 所有检查通过的Alpha列表")
-            if section_start == -1:
+            # 查找"## 1. 所有检查通过的Alpha列表"部分，从该部分开始查找代码块
+            _, found, section_content = content.partition(PASSED_SECTION_TITLE)
+            if not found:
                 logging.error("未找到'所有检查通过的Alpha列表'部分")
                 return []
             
-            # 从该部分开始查找代码块
-            section_content = content[section_start:]
-            
             # 查找第一个```开始的代码块
             code_start = section_content.find("```")
             if code_start == -1:
@@ -99,12 +133,10 @@ class AutoCorrelationChecker:
                 if not line or 'id' in line.lower():  # 跳过空行和表头
                     continue
                 
-                # 使用正则表达式提取第一列的Alpha ID
-                id_pattern = re.compile(r'^\s*(\w+)\s+')
-                match = id_pattern.match(line)
-                if match:
-                    alpha_id = match.group(1)
-                    ids.append(alpha_id)
+                # 第一列即Alpha ID：按空白切出第一个字段（其后至少还要有一列）
+                parts = line.split(None, 1)
+                if len(parts) == 2 and parts[0].isalnum():
+                    ids.append(parts[0])
         
             logging.info(f"成功从'所有检查通过的Alpha列表'提取{len(ids)}个有效Alpha ID")
             return ids
@@ -120,11 +152,13 @@ class AutoCorrelationChecker:
         processed_ids = set()
         try:
             if Path(self.result_path).exists():
-                with open(self.result_path, 'r', encoding='utf-8') as f:
-                    reader = csv.DictReader(f)
-                    for row in reader:
-                        if row.get('alpha_id'):
-                            processed_ids.add(row.get('alpha_id'))
+                with open(self.result_path, 'r', encoding='utf-8', newline='') as f:
+                    # 只需要 alpha_id 一列：按表头定位列下标后直接取值，不为每行构造 dict
+                    reader = csv.reader(f)
+                    header = next(reader, [])
+                    if 'alpha_id' in header:
+                        col = header.index('alpha_id')
+                        processed_ids = {row[col] for row in reader if len(row) > col and row[col]}
                 logging.info(f"从现有结果文件中读取到{len(processed_ids)}个已处理的Alpha ID")
         except Exception as e:
             logging.error(f"读取已处理Alpha ID失败: {e}")
@@ -135,12 +169,15 @@ class AutoCorrelationChecker:
         url = f'https://api.worldquantbrain.com/alphas/{alpha_id}/check'
         count = 0
         while count < self.max_retry:
+            session = self.session
             try:
-                response = self.session.get(url)
+                response = session.get(url)
                 response.raise_for_status()
                 result = response.json()
                 checks = result.get('is', {}).get('checks', [])
-                corr_check = next((c for c in checks if c['name'] == 'SELF_CORRELATION'), None)
+                # 按名称建立索引，一次遍历后即可 O(1) 取出任意检查项
+                checks_by_name = {c['name']: c for c in checks}
+                corr_check = checks_by_name.get('SELF_CORRELATION')
                 if corr_check:
                     return {
                         'alpha_id': alpha_id,
@@ -156,33 +193,71 @@ class AutoCorrelationChecker:
                 count += 1
                 logging.warning(f"检查{alpha_id}失败（第{count}次重试）: {e}")
                 time.sleep(self.retry_interval)
-                if hasattr(response, 'status_code') and response.status_code == 401 and count % 5 == 0:
-                    self.session = self.sign_in()
-                    if not self.session:
+                # 网络错误时没有响应；只有服务端明确返回 401 才重新登录
+                if e.response is not None and e.response.status_code == 401:
+                    if not self._refresh_session(session):
                         break
         error_msg = f"超过最大重试次数（{self.max_retry}次）"
         logging.error(f"{alpha_id}检查失败: {error_msg}")
         return {'alpha_id': alpha_id, 'result': 'FAIL', 'error': error_msg}
 
-    def save_result(self, result):
-        """保存检查结果到CSV（线程安全）"""
-        with self.result_lock:  # 使用锁确保线程安全
-            file_exists = Path(self.result_path).exists()
-            with open(self.result_path, 'a', newline='', encoding='utf-8') as f:  # 保持UTF-8编码
-                fieldnames = ['alpha_id', 'result', 'correlation_value', 'limit', 'timestamp', 'error']
-                writer = csv.DictWriter(f, fieldnames=fieldnames)
-                if not file_exists:
-                    writer.writeheader()
-                writer.writerow(result)
+    def save_results(self, results):
+        """把一批检查结果追加到CSV（只由结果写入线程调用）"""
+        file_exists = Path(self.result_path).exists()
+        with open(self.result_path, 'a', newline='', encoding='utf-8') as f:  # 保持UTF-8编码
+            writer = csv.DictWriter(f, fieldnames=RESULT_FIELDNAMES)
+            if not file_exists:
+                writer.writeheader()
+            writer.writerows(results)
+
+    def _result_writer(self):
+        """
+        结果写入线程：阻塞等待第一条结果，再取走队列中已积压的全部结果一次写入，
+        多个检查线程的结果合并为一次打开/写入，不再逐条加锁。收到 None 时写完剩余结果后退出
+        """
+        while True:
+            batch = [self._result_queue.get()]
+            while True:
+                try:
+                    batch.append(self._result_queue.get_nowait())
+                except Empty:
+                    break
+            done = None in batch
+            results = [r for r in batch if r is not None]
+            if results:
+                try:
+                    self.save_results(results)
+                except OSError as e:
+                    logging.error(f"写入检查结果失败: {e}")
+            if done:
+                return
 
     def process_alpha(self, alpha_id):
         """处理单个Alpha的检查（供线程池调用）"""
         logging.info(f"开始检查Alpha: {alpha_id}")
         check_result = self.check_single_alpha(alpha_id)
-        self.save_result(check_result)
+        self._result_queue.put(check_result)
         logging.info(f"{alpha_id}检查完成: {check_result['result']}")
         return alpha_id, check_result['result']
 
+    def _check_in_pool(self, alpha_ids_to_check, total_alphas):
+        """使用线程池并行检查"""
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.thread_count) as executor:
+            # 提交所有任务到线程池
+            future_to_alpha = {executor.submit(self.process_alpha, alpha_id): alpha_id for alpha_id in alpha_ids_to_check}
+            
+            # 处理完成的任务结果
+            completed = 0
+            for future in concurrent.futures.as_completed(future_to_alpha):
+                alpha_id = future_to_alpha[future]
+                try:
+                    _, result = future.result()
+                    completed += 1
+                    if completed % 10 == 0 or completed == total_alphas:
+                        logging.info(f"进度: {completed}/{total_alphas} ({completed/total_alphas*100:.1f}%)")
+                except Exception as e:
+                    logging.error(f"{alpha_id}处理异常: {e}")
+
     def run(self):
         """执行批量自相关性检查（多线程版本）"""
         self.session = self.sign_in()
@@ -210,22 +285,14 @@ class AutoCorrelationChecker:
         
         logging.info(f"共有{len(alpha_ids)}个Alpha，其中{skipped_alphas}个已处理，{total_alphas}个待检查，使用{self.thread_count}个线程并行处理")
         
-        # 使用线程池并行处理
-        with concurrent.futures.ThreadPoolExecutor(max_workers=self.thread_count) as executor:
-            # 提交所有任务到线程池
-            future_to_alpha = {executor.submit(self.process_alpha, alpha_id): alpha_id for alpha_id in alpha_ids_to_check}
-            
-            # 处理完成的任务结果
-            completed = 0
-            for future in concurrent.futures.as_completed(future_to_alpha):
-                alpha_id = future_to_alpha[future]
-                try:
-                    _, result = future.result()
-                    completed += 1
-                    if completed % 10 == 0 or completed == total_alphas:
-                        logging.info(f"进度: {completed}/{total_alphas} ({completed/total_alphas*100:.1f}%)")
-                except Exception as e:
-                    logging.error(f"{alpha_id}处理异常: {e}")
+        writer_thread = threading.Thread(target=self._result_writer, daemon=True)
+        writer_thread.start()
+        try:
+            self._check_in_pool(alpha_ids_to_check, total_alphas)
+        finally:
+            # 所有检查结束（或被中断）后通知写入线程，等待剩余结果落盘
+            self._result_queue.put(None)
+            writer_thread.join()
         
         logging.info(f"所有Alpha检查完成，共处理{total_alphas}个Alpha，跳过{skipped_alphas}个已处理Alpha，结果已保存至: {self.result_path}")
 
@@ -1,8 +1,20 @@
 import pandas as pd
+import numpy as np
 import ast
+import json
 import glob
+import os
 from datetime import datetime
 
+# 分析用到的回测结果列
+CSV_COLUMNS = {'id', 'grade', 'is'}
+
+# 解析结果缓存文件的后缀（与源CSV放在同一目录）
+PARSED_CACHE_SUFFIX = '.parsed.json'
+
+# 解析缓存格式版本：_parse_csv 的输出列或类型变化时递增，旧缓存随之失效
+CACHE_VERSION = 1
+
 def find_csv_file():
     """在当前文件夹中查找以 'simulated_alphas_' 开头的CSV文件。"""
     csv_files = glob.glob('simulated_alphas_*.csv')
@@ -14,11 +26,19 @@ def find_csv_file():
         print(f"将使用第一个文件进行分析: {csv_files[0]}")
     return csv_files[0]
 
-def count_failures(check_list):
-    """计算检查项中'FAIL'的数量。"""
-    if not isinstance(check_list, list):
-        return 0
-    return sum(1 for check in check_list if check.get('result') == 'FAIL')
+def count_failures(checks):
+    """
+    计算每个Alpha检查项中'FAIL'的数量。checks 为每行一个检查项列表的 Series：
+    展开为每个检查项一行后整体比较 result 列，再按原行号汇总，不再逐行调用 Python 函数。
+    """
+    items = checks.explode().dropna()  # 空列表、缺失值展开后为 NaN，丢弃即可
+    if items.empty:
+        return pd.Series(0, index=checks.index, dtype='int32')
+    results = pd.json_normalize(items.tolist())
+    if 'result' not in results.columns:
+        return pd.Series(0, index=checks.index, dtype='int32')
+    is_fail = pd.Series((results['result'] == 'FAIL').to_numpy(), index=items.index)
+    return is_fail.groupby(level=0).sum().reindex(checks.index, fill_value=0).astype('int32')
 
 def safe_literal_eval(val):
     """
@@ -32,12 +52,78 @@ def safe_literal_eval(val):
             return {}
     return val
 
+def parse_is_value(val):
+    """
+    解析 'is' 列的单个值：AlphaSimulator 现在以 JSON 写入嵌套字段，先用 json.loads 快速解析；
+    旧结果文件中的 Python 字面量（单引号、True/None）解析失败时回退到 safe_literal_eval。
+    """
+    if isinstance(val, str):
+        try:
+            return json.loads(val)
+        except ValueError:
+            return safe_literal_eval(val)
+    return val
+
+def _cache_key(filename):
+    """解析缓存的键：缓存格式版本，以及源CSV的修改时间和大小，任一变化即视为缓存失效。"""
+    st = os.stat(filename)
+    return [CACHE_VERSION, st.st_mtime_ns, st.st_size]
+
+def load_parsed_cache(filename):
+    """
+    读取与源CSV匹配的解析结果缓存，不存在或已失效时返回 None。
+    缓存是纯 JSON（不用 pickle，读取缓存文件不会执行其中的代码），按保存的列类型还原 DataFrame。
+    """
+    try:
+        with open(filename + PARSED_CACHE_SUFFIX, 'rb') as f:
+            cached = json.loads(f.read())
+        if cached['key'] != _cache_key(filename):
+            return None
+        df = pd.DataFrame(cached['columns'], index=cached['index'])
+        return df.astype(cached['dtypes'])[list(cached['dtypes'])]
+    except Exception:
+        return None
+
+def save_parsed_cache(filename, df):
+    """保存解析结果缓存（先写临时文件再替换，避免中断时留下损坏的缓存）。"""
+    cache_file = filename + PARSED_CACHE_SUFFIX
+    # tolist() 得到 Python 原生数值，json 按 repr 写出浮点数，读回后与原值完全一致
+    cached = {
+        'key': _cache_key(filename),
+        'index': df.index.tolist(),
+        'dtypes': {col: str(dtype) for col, dtype in df.dtypes.items()},
+        'columns': {col: df[col].tolist() for col in df.columns},
+    }
+    try:
+        with open(cache_file + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(cached, f, ensure_ascii=False)
+        os.replace(cache_file + '.tmp', cache_file)
+    except OSError as e:
+        print(f"警告：写入解析缓存失败: {e}")
+
 def parse_data(filename):
-    """加载并解析CSV文件，提取嵌套的性能指标和检查项。"""
+    """
+    加载并解析CSV文件，提取嵌套的性能指标和检查项。
+    解析结果按源文件的修改时间和大小缓存，文件未变化时再次分析直接读取缓存。
+    """
+    df = load_parsed_cache(filename)
+    if df is not None:
+        print(f"使用解析缓存: {filename}{PARSED_CACHE_SUFFIX}")
+        return df
+    df = _parse_csv(filename)
+    if df is not None:
+        save_parsed_cache(filename, df)
+    return df
+
+def _parse_csv(filename):
+    """解析CSV文件本身（parse_data 未命中缓存时调用）。"""
     print(f"正在加载并解析文件: {filename}...")
     try:
-        df = pd.read_csv(filename)
-        is_data = df['is'].apply(safe_literal_eval)
+        # 只读取用到的列（结果文件中其余字段很多），并直接指定类型，省去对它们的解析与类型推断；
+        # Alpha ID 是字母数字混合的字符串，按 str 读入。grade 可能不存在，所以用函数筛选列
+        df = pd.read_csv(filename, usecols=lambda col: col in CSV_COLUMNS,
+                         dtype={'id': str, 'grade': str, 'is': str})
+        is_data = [parse_is_value(val) for val in df['is'].tolist()]
         is_metrics_df = pd.json_normalize(is_data)
         
         metrics_to_add = ['fitness', 'sharpe', 'returns', 'turnover', 'margin', 'drawdown']
@@ -48,16 +134,22 @@ def parse_data(filename):
                 df[metric] = pd.NA
         
         if 'checks' in is_metrics_df.columns:
-            is_metrics_df['checks'] = is_metrics_df['checks'].fillna('').apply(list)
-            df['fail_count'] = is_metrics_df['checks'].apply(count_failures)
+            df['fail_count'] = count_failures(is_metrics_df['checks'])
         else:
             df['fail_count'] = 0
 
         if 'grade' not in df.columns:
             df['grade'] = 'N/A'
         
+        # 原始 'is' 字符串已展开为各指标列，后续不再使用，不必保留（也不写入缓存）。
+        # grade 在 dropna 之后才转 category，否则被丢弃行独有的等级会以 0 计数留在类别里
+        df = df.drop(columns=['is']).dropna(subset=metrics_to_add)
+        # grade 取值很少，用 category 存整数编码。指标保持 float64：
+        # 降为 float32 会改变收益/回撤比等派生值的末位，进而改变排名中的并列关系
+        df['grade'] = df['grade'].astype('category')
+
         print("数据解析成功。")
-        return df.dropna(subset=metrics_to_add)
+        return df
         
     except FileNotFoundError:
         print(f"错误：文件 '{filename}' 未找到。")
@@ -68,6 +160,56 @@ def parse_data(filename):
 
 
 
+def rank_desc_first(series):
+    """
+    等价于 series.rank(ascending=False, method='first')：数值越大名次越靠前，相同值按出现顺序排名，
+    NaN 的名次仍为 NaN。直接在 NumPy 数组上做一次稳定排序再回填名次，不经过 pandas 的索引处理。
+    """
+    values = series.to_numpy(dtype=float)
+    ranks = np.full(len(values), np.nan)
+    valid_idx = np.flatnonzero(~np.isnan(values))
+    order = valid_idx[np.argsort(-values[valid_idx], kind='stable')]
+    ranks[order] = np.arange(1, len(order) + 1)
+    return ranks
+
+def describe_metrics(df, columns):
+    """
+    与 df[columns].describe() 输出相同的统计表（count/mean/std/min/25%/50%/75%/max，std 为样本标准差），
+    但把这些列取成一个连续的二维数组，每项统计只需一次按列的 NumPy 计算。
+    """
+    values = df[columns].to_numpy(dtype=float)
+    counts = np.count_nonzero(~np.isnan(values), axis=0)
+    means = np.nanmean(values, axis=0)
+    # 样本数不足 2 时 std 为 NaN（与 describe 一致）；直接按定义计算，避免 nanstd 在 ddof 不足时发出 RuntimeWarning
+    stds = np.full(values.shape[1], np.nan)
+    np.sqrt(np.nansum((values - means) ** 2, axis=0) / np.maximum(counts - 1, 1), out=stds, where=counts > 1)
+    stats = np.vstack([
+        counts,
+        means,
+        stds,
+        np.nanmin(values, axis=0),
+        np.nanpercentile(values, [25, 50, 75], axis=0),
+        np.nanmax(values, axis=0),
+    ])
+    return pd.DataFrame(stats, index=['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max'], columns=columns)
+
+def top_k(df, by, k=10, ascending=False):
+    """
+    返回按 by 列排序后的前 k 行，等价于 df.sort_values(by, ascending=..., kind='stable').head(k)
+    （相同值按原顺序，NaN 排在最后）。先用 np.partition 在 O(N) 内求出第 k 名的值，
+    取出不差于它的所有行（包括与它并列的行），再按 (值, 原位置) 排序后取前 k 个。
+    """
+    values = df[by].to_numpy(dtype=float)
+    if not ascending:
+        values = -values
+    candidates = np.arange(len(values))
+    if k < len(values):
+        threshold = np.partition(values, k - 1)[k - 1]
+        if not np.isnan(threshold):
+            candidates = np.flatnonzero(values <= threshold)
+    idx = candidates[np.lexsort((candidates, values[candidates]))][:k]
+    return df.iloc[idx]
+
 def main():
     """主分析函数"""
     
@@ -79,74 +221,81 @@ def main():
 
     report_filename = "alpha_analysis_report.md"
     
-    with open(report_filename, 'w', encoding='utf-8') as f:
-        f.write(f"# Alpha回测结果分析报告\n\n")
-        f.write(f"**报告生成时间:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        f.write(f"**分析文件:** `{filename}`\n\n")
-
-        # 计算排名和综合分数
-        df['returns_to_drawdown'] = df['returns'] / df['drawdown']
-        df['fitness_rank'] = df['fitness'].rank(ascending=False, method='first')
-        df['sharpe_rank'] = df['sharpe'].rank(ascending=False, method='first')
-        df['r_dd_rank'] = df['returns_to_drawdown'].rank(ascending=False, method='first')
-        df['comprehensive_score'] = df['fitness_rank'] + df['sharpe_rank'] + df['r_dd_rank']
-        df['all_checks_passed'] = df['fail_count'].apply(lambda x: '是' if x == 0 else '否')
-
-        # 1. 所有检查通过的Alpha列表 (移到最前面)
-        f.write("## 1. 所有检查通过的Alpha列表\n\n")
-        all_pass_df = df[df['fail_count'] == 0].copy()
-        
-        if not all_pass_df.empty:
-            all_pass_cols = ['id', 'grade', 'fitness', 'sharpe', 'returns_to_drawdown', 'comprehensive_score']
-            f.write(f"共有 **{len(all_pass_df)}** 个Alpha通过了所有检查项，按综合分数排序如下：\n\n")
-            f.write("```\n" + all_pass_df.sort_values(by='comprehensive_score')[all_pass_cols].to_string(index=False) + "\n```\n\n")
-        else:
-            f.write("未发现任何通过所有检查项的Alpha。\n\n")
+    # 报告各段先收集到列表中，最后一次性写入文件
+    parts = []
+    parts.append(f"# Alpha回测结果分析报告\n\n")
+    parts.append(f"**报告生成时间:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+    parts.append(f"**分析文件:** `{filename}`\n\n")
 
-        # 2. 数据总览
-        f.write("## 2. 数据总览\n\n")
-        f.write(f"- **Alpha 总数:** {len(df)}\n\n")
-        f.write(f"- **不同 'grade' 评级分布:**\n\n")
-        f.write("```\n" + df['grade'].value_counts().to_string() + "\n```\n\n")
-        
-        f.write(f"- **按检查失败项数量分布:**\n\n")
-        fail_counts_dist = df['fail_count'].value_counts().sort_index()
-        fail_counts_dist.index.name = "失败项数量"
-        fail_counts_dist.name = "Alpha数量"
-        f.write("```\n" + fail_counts_dist.to_string() + "\n```\n\n")
-
-        # 3. 核心性能指标统计
-        f.write("## 3. 核心性能指标统计分析\n\n")
-        metrics_to_describe = ['fitness', 'sharpe', 'returns', 'turnover', 'drawdown']
-        f.write("```\n" + df[metrics_to_describe].describe().to_string() + "\n```\n\n")
-
-        # 4. 多维度Top 10 Alpha展示
-        f.write("## 4. 多维度排行榜 Top 10\n\n")
-        
-        comp_cols = ['id', 'grade', 'all_checks_passed', 'fail_count', 'comprehensive_score', 'fitness_rank', 'sharpe_rank', 'r_dd_rank']
-        perf_cols = ['id', 'grade', 'all_checks_passed', 'fitness', 'sharpe']
-        risk_cols = ['id', 'grade', 'all_checks_passed', 'returns_to_drawdown', 'returns', 'drawdown']
+    # 计算排名和综合分数（df.eval 在装有 NumExpr 时整体求值，不产生中间临时数组；否则回退到普通 pandas 运算）
+    df.eval('returns_to_drawdown = returns / drawdown', inplace=True)
+    df['fitness_rank'] = rank_desc_first(df['fitness'])
+    df['sharpe_rank'] = rank_desc_first(df['sharpe'])
+    df['r_dd_rank'] = rank_desc_first(df['returns_to_drawdown'])
+    df.eval('comprehensive_score = fitness_rank + sharpe_rank + r_dd_rank', inplace=True)
+    # "是否全部通过"的掩码只计算一次，标记列与全通过 / 有失败项两个子集共用
+    pass_mask = df['fail_count'].to_numpy() == 0
+    # 直接由掩码构造分类列（编码 0='是'，1='否'），每行只存一个 int8 编码而不是字符串对象
+    df['all_checks_passed'] = pd.Categorical.from_codes((~pass_mask).astype('int8'), categories=['是', '否'])
 
-        f.write("### 综合排名 Top 10 (优先显示全Pass, 分数越低越好)\n\n")
-        f.write("```\n" + df.sort_values(by=['fail_count', 'comprehensive_score'], ascending=[True, True]).head(10)[comp_cols].to_string(index=False) + "\n```\n\n")
-        
-        f.write("### **潜力Alpha**排行 Top 10 (有未通过项, 但指标优秀)\n\n")
-        
-        # --- 错误修复 ---
-        # 错误行: failed_but_good_df = df[df[df['fail_count'] > 0].index]
-        # 修正后:
-        failed_but_good_df = df[df['fail_count'] > 0].copy()
-        
-        if not failed_but_good_df.empty:
-            f.write("```\n" + failed_but_good_df.sort_values(by='comprehensive_score').head(10)[comp_cols].to_string(index=False) + "\n```\n\n")
-        else:
-            f.write("未发现有失败项的Alpha。\n\n")
+    # 按综合分数只排序一次：全通过列表、综合排名、潜力Alpha三个部分都从这份有序结果中筛选
+    order = np.argsort(df['comprehensive_score'].to_numpy(), kind='stable')
+    df_sorted = df.iloc[order]
+    sorted_pass_mask = pass_mask[order]
+    all_pass_df = df_sorted[sorted_pass_mask]
+    failed_but_good_df = df_sorted[~sorted_pass_mask]
+    # 在按分数有序的基础上再按失败项数量稳定排序，即"失败项数量优先、分数其次"
+    comp_top_df = df_sorted.iloc[np.argsort(df_sorted['fail_count'].to_numpy(), kind='stable')[:10]]
+
+    # 1. 所有检查通过的Alpha列表 (移到最前面)
+    parts.append("## 1. 所有检查通过的Alpha列表\n\n")
+    if not all_pass_df.empty:
+        all_pass_cols = ['id', 'grade', 'fitness', 'sharpe', 'returns_to_drawdown', 'comprehensive_score']
+        parts.append(f"共有 **{len(all_pass_df)}** 个Alpha通过了所有检查项，按综合分数排序如下：\n\n")
+        parts.append("```\n" + all_pass_df[all_pass_cols].to_string(index=False) + "\n```\n\n")
+    else:
+        parts.append("未发现任何通过所有检查项的Alpha。\n\n")
+
+    # 2. 数据总览
+    parts.append("## 2. 数据总览\n\n")
+    parts.append(f"- **Alpha 总数:** {len(df)}\n\n")
+    parts.append(f"- **不同 'grade' 评级分布:**\n\n")
+    parts.append("```\n" + df['grade'].value_counts().to_string() + "\n```\n\n")
+    
+    parts.append(f"- **按检查失败项数量分布:**\n\n")
+    fail_counts_dist = df['fail_count'].value_counts().sort_index()
+    fail_counts_dist.index.name = "失败项数量"
+    fail_counts_dist.name = "Alpha数量"
+    parts.append("```\n" + fail_counts_dist.to_string() + "\n```\n\n")
 
-        f.write("### Fitness 排行 Top 10\n\n```\n" + df.sort_values(by='fitness', ascending=False).head(10)[perf_cols].to_string(index=False) + "\n```\n\n")
-        f.write("### Sharpe 排行 Top 10\n\n```\n" + df.sort_values(by='sharpe', ascending=False).head(10)[perf_cols].to_string(index=False) + "\n```\n\n")
-        f.write("### 收益/回撤比 排行 Top 10\n\n```\n" + df.sort_values(by='returns_to_drawdown', ascending=False).head(10)[risk_cols].to_string(index=False) + "\n```\n\n")
+    # 3. 核心性能指标统计
+    parts.append("## 3. 核心性能指标统计分析\n\n")
+    metrics_to_describe = ['fitness', 'sharpe', 'returns', 'turnover', 'drawdown']
+    parts.append("```\n" + describe_metrics(df, metrics_to_describe).to_string() + "\n```\n\n")
 
+    # 4. 多维度Top 10 Alpha展示
+    parts.append("## 4. 多维度排行榜 Top 10\n\n")
+    
+    comp_cols = ['id', 'grade', 'all_checks_passed', 'fail_count', 'comprehensive_score', 'fitness_rank', 'sharpe_rank', 'r_dd_rank']
+    perf_cols = ['id', 'grade', 'all_checks_passed', 'fitness', 'sharpe']
+    risk_cols = ['id', 'grade', 'all_checks_passed', 'returns_to_drawdown', 'returns', 'drawdown']
+
+    parts.append("### 综合排名 Top 10 (优先显示全Pass, 分数越低越好)\n\n")
+    parts.append("```\n" + comp_top_df[comp_cols].to_string(index=False) + "\n```\n\n")
+    
+    parts.append("### **潜力Alpha**排行 Top 10 (有未通过项, 但指标优秀)\n\n")
+    
+    if not failed_but_good_df.empty:
+        parts.append("```\n" + failed_but_good_df.head(10)[comp_cols].to_string(index=False) + "\n```\n\n")
+    else:
+        parts.append("未发现有失败项的Alpha。\n\n")
+
+    parts.append("### Fitness 排行 Top 10\n\n```\n" + top_k(df, 'fitness')[perf_cols].to_string(index=False) + "\n```\n\n")
+    parts.append("### Sharpe 排行 Top 10\n\n```\n" + top_k(df, 'sharpe')[perf_cols].to_string(index=False) + "\n```\n\n")
+    parts.append("### 收益/回撤比 排行 Top 10\n\n```\n" + top_k(df, 'returns_to_drawdown')[risk_cols].to_string(index=False) + "\n```\n\n")
 
+    with open(report_filename, 'w', encoding='utf-8') as f:
+        f.write("".join(parts))
 
     print(f"\n分析全部完成！详细报告已保存到文件: {report_filename}")
 
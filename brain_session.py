@@ -0,0 +1,72 @@
+import json
+import logging
+import os
+import time
+
+import requests
+
+
+logger = logging.getLogger(__name__)
+
+# 登录会话 cookie 缓存文件（AlphaCreator 与 AlphaSimulator 共用），有效期内跳过重复认证
+SESSION_CACHE_FILE = '~/.brain_session.json'
+
+# 轻量接口，用于验证会话 cookie 是否仍然有效
+SESSION_CHECK_URL = 'https://api.worldquantbrain.com/users/self'
+
+
+def load_cached_session(session, username):
+    """尝试用缓存的会话 cookie 恢复登录状态，并用一个轻量接口验证是否仍然有效"""
+    try:
+        with open(os.path.expanduser(SESSION_CACHE_FILE)) as f:
+            cached = json.load(f)
+        if cached.get('username') != username or cached.get('expiry', 0) <= time.time():
+            return False
+        session.cookies.update(cached['cookies'])
+        if session.get(SESSION_CHECK_URL).status_code == 200:
+            return True
+    except (OSError, ValueError, KeyError, TypeError, requests.exceptions.RequestException):
+        pass
+    session.cookies.clear()
+    return False
+
+
+def save_session_cache(session, username, response):
+    """保存登录后的会话 cookie（仅当前用户可读），有效期取认证响应中的 token.expiry"""
+    try:
+        expiry = float(json.loads(response.content).get('token', {}).get('expiry', 3600))
+    except (ValueError, TypeError, AttributeError):
+        expiry = 3600
+    cached = {'username': username, 'cookies': session.cookies.get_dict(), 'expiry': time.time() + expiry}
+    try:
+        fd = os.open(os.path.expanduser(SESSION_CACHE_FILE), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(cached, f)
+    except OSError as e:
+        logger.warning("Failed to cache session cookies: %s", e)
+
+
+def drop_basic_auth(session):
+    """
+    认证成功后改用会话 cookie，后续请求不再携带 Authorization 头；
+    cookie 验证不通过时保留 Basic Auth。凭证由调用方保存，供会话过期后重新登录
+    """
+    basic_auth, session.auth = session.auth, None
+    try:
+        if session.get(SESSION_CHECK_URL).status_code == 200:
+            return
+    except requests.exceptions.RequestException:
+        pass
+    logger.warning("Session cookie was not accepted, keeping Basic Auth on the session.")
+    session.auth = basic_auth
+
+
+def refresh_session(owner, stale_session, sign_in, lock):
+    """
+    会话过期时重新登录（线程安全），结果写回 owner.session。stale_session 是调用方发出请求时使用的会话：
+    若 owner.session 已不是它（其它线程已经换过会话），直接复用新会话而不重复登录
+    """
+    with lock:
+        if owner.session is stale_session:
+            owner.session = sign_in()
+        return owner.session
@@ -9,6 +9,8 @@ import json
 import logging
 import os
 from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
 from AlphaCreator import AlphaCreator
 from AlphaSimulator import AlphaSimulator
 
@@ -28,9 +30,17 @@ def setup_logging():
     )
 
 
+@lru_cache(maxsize=1)
+def _read_credentials(credentials_file):
+    """读取并解析凭证文件；只缓存成功的结果，读取失败时抛出的异常不会被缓存"""
+    credentials = json.loads(Path(credentials_file).read_bytes())
+    return credentials[0], credentials[1]
+
+
 def load_credentials(credentials_file='brain.txt'):
     """
-    加载登录凭证
+    加载登录凭证（成功的结果按文件路径缓存，多次调用只读取一次文件；
+    读取失败时不缓存，修正 brain.txt 后再次调用即可读到）
     
     Args:
         credentials_file: 凭证文件路径
@@ -39,9 +49,7 @@ def load_credentials(credentials_file='brain.txt'):
         tuple: (username, password)
     """
     try:
-        with open(credentials_file, 'r') as f:
-            credentials = json.load(f)
-        return credentials[0], credentials[1]
+        return _read_credentials(credentials_file)
     except Exception as e:
         logging.error(f"加载凭证失败: {str(e)}")
         return None, None